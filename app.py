@@ -1,9 +1,31 @@
 import os
-from fastapi import FastAPI, Header, HTTPException
-from pydantic import BaseModel
-from transformers import AutoTokenizer, AutoModelForCausalLM
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI, Header, HTTPException, Request
+from pydantic import BaseModel, Field
+from transformers import AutoTokenizer, AutoModelForCausalLM, StoppingCriteria, StoppingCriteriaList
 import torch
-from config import MODEL_ID
+from config import (
+    MODEL_ID,
+    MAX_CONCURRENT_REQUESTS,
+    MAX_QUEUED_REQUESTS,
+    QUEUE_TIMEOUT_S,
+    DEFAULT_DEADLINE_S,
+    MAX_DEADLINE_S,
+    TORCH_THREADS,
+)
+
+
+# Thread budget: each running generation gets its share of the cores this process may
+# use (cgroup/affinity aware), so concurrent requests do not oversubscribe the CPU
+CPUS = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+torch.set_num_threads(TORCH_THREADS or max(1, CPUS // MAX_CONCURRENT_REQUESTS))
+try:
+    torch.set_num_interop_threads(1)
+except RuntimeError:
+    pass  # already set, interop threads can only be configured once per process
 
 
 # Load API key from file
@@ -17,10 +39,13 @@ def load_api_key():
 
 API_KEY = load_api_key()
 
+DISCONNECT_POLL_S = 0.1
+
 
 class GenRequest(BaseModel):
     prompt: str
     max_new_tokens: int = 64
+    timeout_s: float | None = Field(None, gt=0)  # generation deadline, capped at MAX_DEADLINE_S
 
 
 app = FastAPI()
@@ -29,16 +54,38 @@ tokenizer = AutoTokenizer.from_pretrained(MODEL_ID, use_fast=True)
 model = AutoModelForCausalLM.from_pretrained(MODEL_ID, dtype=torch.float16, device_map="auto")
 model.eval()
 
+# Generations run on a dedicated pool sized to the admission limit, not on the
+# default request threadpool
+executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS, thread_name_prefix="generate")
+slots = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+waiting = 0  # requests queued for a slot, only touched from the event loop
+
+
+class StopOnDeadlineOrCancel(StoppingCriteria):
+    """Stop generating once the deadline passed or the client went away"""
+
+    def __init__(self, deadline: float, cancelled: threading.Event):
+        self.deadline = deadline
+        self.cancelled = cancelled
+        self.fired = None  # "cancelled" or "deadline" once this criterion stopped generation
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if self.cancelled.is_set():
+            self.fired = "cancelled"
+        elif time.monotonic() >= self.deadline:
+            self.fired = "deadline"
+        stop = self.fired is not None
+        return torch.full((input_ids.shape[0],), stop, dtype=torch.bool, device=input_ids.device)
+
 
 def _auth(x_api_key: str | None):
     if x_api_key != API_KEY:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
 
-@app.post("/generate")
-def generate(req: GenRequest, x_api_key: str | None = Header(None)):
-    _auth(x_api_key)
+def _generate(req: GenRequest, deadline: float, cancelled: threading.Event) -> dict:
     inputs = tokenizer(req.prompt, return_tensors="pt").to(model.device)
+    stop_early = StopOnDeadlineOrCancel(deadline, cancelled)
     with torch.no_grad():
         out = model.generate(
             **inputs,
@@ -46,6 +93,55 @@ def generate(req: GenRequest, x_api_key: str | None = Header(None)):
             do_sample=True,
             temperature=0.7,
             top_p=0.95,
+            stopping_criteria=StoppingCriteriaList([stop_early]),
         )
     text = tokenizer.decode(out[0], skip_special_tokens=True)
-    return {"text": text}
+
+    if stop_early.fired:
+        finish_reason = stop_early.fired
+    elif out.shape[1] - inputs["input_ids"].shape[1] >= req.max_new_tokens:
+        finish_reason = "length"
+    else:
+        finish_reason = "stop"
+    return {"text": text, "finish_reason": finish_reason}
+
+
+async def _acquire_slot(deadline: float) -> None:
+    """Admission control: reject at once when the queue is full, 503 if no slot frees up in time"""
+    global waiting
+    if slots.locked() and waiting >= MAX_QUEUED_REQUESTS:
+        raise HTTPException(status_code=429, detail="Too many requests", headers={"Retry-After": "1"})
+
+    waiting += 1
+    try:
+        timeout = min(QUEUE_TIMEOUT_S, deadline - time.monotonic())
+        await asyncio.wait_for(slots.acquire(), timeout=max(0.0, timeout))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Server busy", headers={"Retry-After": "1"})
+    finally:
+        waiting -= 1
+
+
+@app.post("/generate")
+async def generate(req: GenRequest, request: Request, x_api_key: str | None = Header(None)):
+    _auth(x_api_key)
+    deadline = time.monotonic() + min(req.timeout_s or DEFAULT_DEADLINE_S, MAX_DEADLINE_S)
+
+    await _acquire_slot(deadline)
+
+    cancelled = threading.Event()
+    future = asyncio.get_running_loop().run_in_executor(executor, _generate, req, deadline, cancelled)
+    # the slot is held until the worker thread is really done, not until we stop waiting for it
+    future.add_done_callback(lambda _: slots.release())
+
+    try:
+        while True:
+            done, _ = await asyncio.wait({future}, timeout=DISCONNECT_POLL_S)
+            if done:
+                return future.result()
+            if await request.is_disconnected():
+                cancelled.set()
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        if not future.done():
+            cancelled.set()
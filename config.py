@@ -8,3 +8,11 @@ MODEL_ID = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
 # MODEL_ID = "gpt2"
 # MODEL_ID = "EleutherAI/gpt-neo-125M"
 # MODEL_ID = "distilgpt2"
+
+# Serving configuration (app.py)
+MAX_CONCURRENT_REQUESTS = 2   # generations running at the same time
+MAX_QUEUED_REQUESTS = 8       # requests waiting for a slot, beyond this they get 429
+QUEUE_TIMEOUT_S = 10.0        # max wait for a slot before answering 503
+DEFAULT_DEADLINE_S = 30.0     # per-request generation deadline when the client sends none
+MAX_DEADLINE_S = 120.0        # upper bound for client supplied deadlines
+TORCH_THREADS = None          # intra-op threads per generation (default: cores / MAX_CONCURRENT_REQUESTS)
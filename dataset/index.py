@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Sidecar Index for Processed JSONL Datasets
+Byte-offset index for O(1) sample lookup plus optional field indexes
+"""
+
+import os
+import re
+import sys
+import json
+import array
+import struct
+import random
+
+from typing import Dict, Iterator, List, Optional
+
+
+# Sidecar layout for `<file>.jsonl`:
+#   `<file>.jsonl.idx`    header (magic, source size, source mtime_ns) + one uint64 offset per sample
+#   `<file>.jsonl.fields` header (magic, source size, source mtime_ns, table offset, table length),
+#                         uint64 posting arrays (sample numbers), then a small JSON table
+#                         {field: {value: [posting offset, count]}}
+INDEX_MAGIC = b"PKIDX001"
+HEADER = struct.Struct("<8sQQ")
+OFFSET = struct.Struct("<Q")
+FIELDS_MAGIC = b"PKFLD001"
+FIELDS_HEADER = struct.Struct("<8sQQQQ")
+
+FIELDS = ("type", "turn", "pokemon")
+
+TURN_RE = re.compile(r"^Pokemon Battle Turn (\d+)", re.MULTILINE)
+ACTIVE_RE = re.compile(r"^Your active: (.+)$", re.MULTILINE)
+
+
+def extract_fields(sample: Dict) -> Dict[str, Optional[str]]:
+    """Extract indexable fields (action type, turn, active Pokemon) from a sample"""
+    output = sample.get("output", "")
+    text = sample.get("input", "")
+
+    if output.startswith("use "):
+        action_type = "move"
+    elif output.startswith("switch to "):
+        action_type = "switch"
+    else:
+        action_type = None
+
+    turn = TURN_RE.search(text)
+    active = ACTIVE_RE.search(text)
+
+    return {
+        "type": action_type,
+        "turn": turn.group(1) if turn else None,
+        "pokemon": active.group(1).strip().lower() if active else None,
+    }
+
+
+def _source_stamp(filepath: str) -> tuple:
+    stat = os.stat(filepath)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def build_index(filepath: str, with_fields: bool = True) -> int:
+    """Scan a JSONL file once and write its sidecar index files, returns number of samples"""
+    size, mtime_ns = _source_stamp(filepath)
+    fields: Dict[str, Dict[str, array.array]] = {name: {} for name in FIELDS}
+    count = 0
+
+    with open(filepath, 'rb') as src, open(filepath + ".idx.tmp", 'wb') as idx:
+        idx.write(HEADER.pack(INDEX_MAGIC, size, mtime_ns))
+        offset = 0
+        for line in src:
+            if line.strip():
+                try:
+                    sample = json.loads(line)
+                except json.JSONDecodeError:
+                    sample = None
+                if isinstance(sample, dict):
+                    idx.write(OFFSET.pack(offset))
+                    if with_fields:
+                        for name, value in extract_fields(sample).items():
+                            if value is not None:
+                                fields[name].setdefault(value, array.array('Q')).append(count)
+                    count += 1
+            offset += len(line)
+
+    os.replace(filepath + ".idx.tmp", filepath + ".idx")
+
+    if with_fields:
+        _write_fields(filepath, size, mtime_ns, fields)
+
+    return count
+
+
+def _write_fields(filepath: str, size: int, mtime_ns: int, fields: Dict[str, Dict[str, array.array]]) -> None:
+    """Write posting arrays followed by their value -> (offset, count) table"""
+    table: Dict[str, Dict[str, List[int]]] = {name: {} for name in fields}
+    with open(filepath + ".fields.tmp", 'wb') as f:
+        f.write(FIELDS_HEADER.pack(FIELDS_MAGIC, 0, 0, 0, 0))
+        for name, values in fields.items():
+            for value, postings in values.items():
+                table[name][value] = [f.tell(), len(postings)]
+                if sys.byteorder == "big":
+                    postings.byteswap()
+                f.write(postings.tobytes())
+        table_offset = f.tell()
+        table_bytes = json.dumps(table).encode('utf-8')
+        f.write(table_bytes)
+        f.seek(0)
+        f.write(FIELDS_HEADER.pack(FIELDS_MAGIC, size, mtime_ns, table_offset, len(table_bytes)))
+    os.replace(filepath + ".fields.tmp", filepath + ".fields")
+
+
+class JsonlIndex:
+    """Random access to samples of a processed JSONL file through its sidecar index"""
+
+    def __init__(self, filepath: str, rebuild: bool = False):
+        self.filepath = filepath
+        self.idx_path = filepath + ".idx"
+        self.fields_path = filepath + ".fields"
+        self._fields = None
+        self._fields_file = None
+
+        if rebuild or not self._is_fresh():
+            build_index(filepath)
+
+        self._data = open(filepath, 'rb')
+        self._idx = open(self.idx_path, 'rb')
+        self._len = (os.path.getsize(self.idx_path) - HEADER.size) // OFFSET.size
+
+    def _is_fresh(self) -> bool:
+        """Index exists and was built from the current version of the source file"""
+        if not os.path.exists(self.idx_path):
+            return False
+        with open(self.idx_path, 'rb') as f:
+            header = f.read(HEADER.size)
+        if len(header) != HEADER.size:
+            return False
+        magic, size, mtime_ns = HEADER.unpack(header)
+        return magic == INDEX_MAGIC and (size, mtime_ns) == _source_stamp(self.filepath)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, k: int) -> Dict:
+        """Read sample k with two seeks, independent of file size"""
+        if k < 0:
+            k += self._len
+        if not 0 <= k < self._len:
+            raise IndexError(f"sample {k} out of range (0..{self._len - 1})")
+        self._idx.seek(HEADER.size + k * OFFSET.size)
+        (offset,) = OFFSET.unpack(self._idx.read(OFFSET.size))
+        self._data.seek(offset)
+        return json.loads(self._data.readline())
+
+    def _open_fields(self):
+        """Open the field sidecar, rebuilding it if missing or stale, and return its header"""
+        if os.path.exists(self.fields_path):
+            f = open(self.fields_path, 'rb')
+            header = f.read(FIELDS_HEADER.size)
+            if len(header) == FIELDS_HEADER.size:
+                magic, size, mtime_ns, table_offset, table_len = FIELDS_HEADER.unpack(header)
+                if magic == FIELDS_MAGIC and (size, mtime_ns) == _source_stamp(self.filepath):
+                    return f, table_offset, table_len
+            f.close()
+        build_index(self.filepath)
+        f = open(self.fields_path, 'rb')
+        _, _, _, table_offset, table_len = FIELDS_HEADER.unpack(f.read(FIELDS_HEADER.size))
+        return f, table_offset, table_len
+
+    def fields(self) -> Dict[str, Dict[str, List[int]]]:
+        """Field value table {field: {value: [posting offset, count]}}, loaded lazily
+
+        Only this small table is parsed; posting lists stay on disk until `filter` needs them.
+        """
+        if self._fields is None:
+            self._fields_file, table_offset, table_len = self._open_fields()
+            self._fields_file.seek(table_offset)
+            self._fields = json.loads(self._fields_file.read(table_len))
+        return self._fields
+
+    def postings(self, name: str, value: str) -> array.array:
+        """Sample numbers with field `name` equal to `value`, read with a single seek"""
+        fields = self.fields()
+        if name not in fields:
+            raise KeyError(f"unknown field '{name}', expected one of {FIELDS}")
+        if name == "pokemon":
+            value = value.lower()
+        postings = array.array('Q')
+        entry = fields[name].get(str(value))
+        if entry is None:
+            return postings
+        offset, count = entry
+        self._fields_file.seek(offset)
+        postings.frombytes(self._fields_file.read(count * postings.itemsize))
+        if sys.byteorder == "big":
+            postings.byteswap()
+        return postings
+
+    def filter(self, **criteria: Optional[str]) -> List[int]:
+        """Sample numbers matching all given field values, e.g. filter(type="switch", turn="3")"""
+        lists = [self.postings(name, value) for name, value in criteria.items() if value is not None]
+        if not lists:
+            return list(range(self._len))
+        # intersect starting from the shortest posting list, lists are already sorted
+        lists.sort(key=len)
+        result = lists[0].tolist()
+        for postings in lists[1:]:
+            if not result:
+                break
+            matches = set(postings)
+            result = [k for k in result if k in matches]
+        return result
+
+    def select(self, num_samples: int, start: int = 0, shuffle: bool = False,
+               seed: Optional[int] = None, **criteria: Optional[str]) -> Iterator[tuple]:
+        """Yield (sample number, sample) pairs for a contiguous, random or filtered subset"""
+        if any(value is not None for value in criteria.values()):
+            candidates = self.filter(**criteria)
+        else:
+            candidates = range(self._len)
+
+        if shuffle:
+            rng = random.Random(seed)
+            chosen = rng.sample(candidates, min(num_samples, len(candidates)))
+        else:
+            chosen = candidates[start:start + num_samples]
+
+        for k in chosen:
+            yield k, self[k]
+
+    def close(self) -> None:
+        self._data.close()
+        self._idx.close()
+        if self._fields_file is not None:
+            self._fields_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
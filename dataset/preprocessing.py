@@ -15,6 +15,8 @@ from tqdm import tqdm
 from typing import List, Dict, Optional
 from rich.console import Console
 
+from index import build_index
+
 
 @dataclass
 class Args:
@@ -268,6 +270,10 @@ def main():
             json.dump(sample, f, ensure_ascii=False)
             f.write('\n')
 
+    # Build sidecar indexes for constant-time sample lookup
+    for split_file in (train_file, val_file, test_file):
+        build_index(split_file)
+
     console.print(f"[green]* Train samples[/green]: {len(train_samples):6d} -> {train_file}")
     console.print(f"[yellow]* Val   samples[/yellow]: {len(val_samples):6d} -> {val_file}")
     console.print(f"[blue]* Test  samples[/blue]: {len(test_samples):6d} -> {test_file}")
@@ -7,13 +7,15 @@ Clean and simple visualization for processed JSONL datasets
 import os
 import json
 import tyro
-from typing import List, Dict
+from typing import List, Dict, Optional
 from dataclasses import dataclass
 from rich.console import Console
 from rich.syntax import Syntax
 from rich.panel import Panel
 from rich import print as rprint
 
+from index import JsonlIndex
+
 
 @dataclass
 class Args:
@@ -22,6 +24,20 @@ class Args:
     """Name of JSONL dataset file in dataset/processed/ folder"""
     num_samples: int = 1
     """Number of samples to display per split (default: 1)"""
+    start: int = 0
+    """Index of the first sample to display"""
+    random: bool = False
+    """Display randomly chosen samples instead of the first ones"""
+    seed: Optional[int] = None
+    """Seed for --random sample selection"""
+    type: Optional[str] = None
+    """Only show samples with this action type (move or switch)"""
+    turn: Optional[int] = None
+    """Only show samples from this turn"""
+    pokemon: Optional[str] = None
+    """Only show samples where this Pokemon is your active one"""
+    rebuild_index: bool = False
+    """Force rebuilding the sidecar index files"""
 
 
 def visualize_sample(sample: Dict, sample_num: int) -> None:
@@ -52,8 +68,10 @@ def visualize_sample(sample: Dict, sample_num: int) -> None:
     console.print()  # Add spacing between samples
 
 
-def visualize_dataset(filepath: str, num_samples: int = 5) -> None:
-    """Visualize samples from a processed JSONL dataset file"""
+def visualize_dataset(filepath: str, num_samples: int = 5, start: int = 0,
+                      random: bool = False, seed: Optional[int] = None,
+                      filters: Optional[Dict] = None, rebuild_index: bool = False) -> None:
+    """Visualize samples from a processed JSONL dataset file via its sidecar index"""
     console = Console()
 
     if not os.path.exists(filepath):
@@ -62,32 +80,31 @@ def visualize_dataset(filepath: str, num_samples: int = 5) -> None:
 
     console.print(f"[green]📊 Loading samples from: {filepath}[/green]")
 
-    samples = []
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.strip():
-                    try:
-                        sample = json.loads(line)
-                        samples.append(sample)
-                    except json.JSONDecodeError:
-                        continue
+        index = JsonlIndex(filepath, rebuild=rebuild_index)
     except Exception as e:
         console.print(f"[red]❌ Error reading file: {e}[/red]")
         return
 
-    if not samples:
-        console.print("[red]❌ No valid samples found[/red]")
-        return
+    with index:
+        if len(index) == 0:
+            console.print("[red]❌ No valid samples found[/red]")
+            return
 
-    console.print()
+        console.print()
 
-    # Display the requested number of samples
-    for i, sample in enumerate(samples[:num_samples], 1):
-        visualize_sample(sample, i)
+        # Display the requested number of samples
+        selected = index.select(num_samples, start=start, shuffle=random, seed=seed, **(filters or {}))
+        shown = 0
+        for k, sample in selected:
+            visualize_sample(sample, k + 1)
+            shown += 1
 
+        if shown == 0:
+            console.print("[yellow]⚠️ No samples match the given filters[/yellow]")
 
-def visualize_all_splits(dataset_name: str, num_samples: int = 1) -> None:
+
+def visualize_all_splits(dataset_name: str, num_samples: int = 1, **kwargs) -> None:
     """Visualize samples from train, val, and test splits"""
     console = Console()
 
@@ -105,7 +122,7 @@ def visualize_all_splits(dataset_name: str, num_samples: int = 1) -> None:
         console.print("=" * 60)
 
         if os.path.exists(filepath):
-            visualize_dataset(filepath, num_samples)
+            visualize_dataset(filepath, num_samples, **kwargs)
         else:
             console.print(f"[red]❌ {split_name} split not found: {filepath}[/red]")
 
@@ -114,7 +131,16 @@ def main():
     args = tyro.cli(Args)
 
     # Always show samples from all available splits (train, val, test)
-    visualize_all_splits(args.dataset, args.num_samples)
+    filters = {"type": args.type, "turn": args.turn, "pokemon": args.pokemon}
+    visualize_all_splits(
+        args.dataset,
+        args.num_samples,
+        start=args.start,
+        random=args.random,
+        seed=args.seed,
+        filters=filters,
+        rebuild_index=args.rebuild_index,
+    )
 
 
 if __name__ == "__main__":
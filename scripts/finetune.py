@@ -1,15 +1,20 @@
 import os
 import json
 import tyro
+import torch
 
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
 from datasets import load_dataset
 # from unsloth import FastLanguageModel  # Commented out - requires NVIDIA/Intel GPU
 from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig, TrainingArguments
 from peft import LoraConfig, get_peft_model, TaskType
 from trl import SFTTrainer, SFTConfig
 
+from streaming import PackedJsonlStream, StreamingTrainer, StreamCheckpointCallback, load_stream_state
+from telemetry import attach_telemetry
+
 
 SYSTEM_INSTRUCTION = "You are a pro Pokèmon Showdown player. Find the best action given this battle state"
 
@@ -22,8 +27,25 @@ class Args:
     use_qlora = True                  # 4-bit by default with Unsloth
     use_wandb = False              # set True to log to Weights & Biases
     wandb_project = "poke-llm"
+    streaming: bool = False           # stream + pack from disk instead of loading splits in RAM
+    shuffle_buffer: int = 10000       # samples held in the streaming shuffle buffer
+    max_seq_length: int = 2048
+    max_steps: int = -1               # required with --streaming (the stream has no length)
+    seed: int = 3407
+    resume_from_checkpoint: Optional[str] = None
+    per_device_train_batch_size: int = 1
+    gradient_accumulation_steps: int = 8
+    gradient_checkpointing: bool = True
+    telemetry_dir: Optional[str] = None  # tokens/sec, step breakdown, RSS (default: <out_dir>/telemetry)
+    profile_start_step: int = -1      # capture a torch profiler trace after this step (-1 = off)
+    profile_num_steps: int = 3        # number of steps covered by the profiler trace
+    threads_per_worker: Optional[int] = None  # torch threads per process (default with torchrun: cores / local workers)
+    save_on_each_node: bool = False   # multi-node with node-local out_dir: every node writes full checkpoints
 
     def __post_init__(self):
+        if self.streaming and self.max_steps <= 0:
+            raise ValueError("--streaming requires --max_steps > 0")
+
         self.train_path = os.path.join(f"dataset/processed/train/{self.dataset}.jsonl")
         self.val_path = os.path.join(f"dataset/processed/val/{self.dataset}.jsonl")
 
@@ -34,13 +56,32 @@ class Args:
             model_basename = self.model_name.split("/")[-1].replace(":", "_")
             self.out_dir = f"models/lora-{model_basename}"
 
+        if self.telemetry_dir is None:
+            self.telemetry_dir = os.path.join(self.out_dir, "telemetry")
+
 
 if __name__ == "__main__":
 
     args = tyro.cli(Args)
 
-    train_ds = load_dataset("json", data_files=args.train_path)["train"]
-    val_ds = load_dataset("json", data_files=args.val_path)["train"] if args.val_path else None
+    # Data-parallel workers when launched with torchrun (gloo on CPU, see README)
+    rank = int(os.environ.get("RANK", 0))
+    world_size = int(os.environ.get("WORLD_SIZE", 1))
+    local_world_size = int(os.environ.get("LOCAL_WORLD_SIZE", 1))
+    distributed = world_size > 1
+
+    # torchrun defaults OMP_NUM_THREADS to 1, split the node cores between local workers instead;
+    # single-process runs keep torch's default unless asked otherwise
+    if args.threads_per_worker:
+        torch.set_num_threads(args.threads_per_worker)
+    elif distributed:
+        # cores this process may run on (cgroup/affinity aware), not every CPU on the host
+        cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+        torch.set_num_threads(max(1, cpus // local_world_size))
+
+    if not args.streaming:
+        train_ds = load_dataset("json", data_files=args.train_path)["train"]
+        val_ds = load_dataset("json", data_files=args.val_path)["train"] if args.val_path else None
 
     # Load base model + tokenizer
     # model, tokenizer = FastLanguageModel.from_pretrained(
@@ -52,7 +93,9 @@ if __name__ == "__main__":
 
     # Standard transformers loading
     quantization_config = None
-    if args.use_qlora:
+    if args.use_qlora and distributed:
+        print("⚠️ 4-bit QLoRA is not supported with data-parallel CPU workers, loading full precision")
+    elif args.use_qlora:
         quantization_config = BitsAndBytesConfig(
             load_in_4bit=True,
             bnb_4bit_compute_dtype="float16",
@@ -108,6 +151,39 @@ if __name__ == "__main__":
 
     model = get_peft_model(model, lora_config)
 
+    if distributed:
+        # DDP broadcasts every parameter from rank 0 at construction; skip the frozen base
+        # weights (identical on all ranks after loading) so only LoRA weights are ever synced
+        model._ddp_params_and_buffers_to_ignore = [
+            name for name, param in model.named_parameters() if not param.requires_grad
+        ]
+
+    if args.streaming:
+        # Packing happens inside the stream, one block per training example
+        train_ds = PackedJsonlStream(
+            args.train_path, tokenizer, SYSTEM_INSTRUCTION,
+            max_seq_length=args.max_seq_length,
+            shuffle_buffer=args.shuffle_buffer,
+            seed=args.seed,
+            rank=rank,
+            world_size=world_size,
+        )
+        # every rank evaluates the full (small) val split so all ranks run the same number of steps
+        val_ds = PackedJsonlStream(
+            args.val_path, tokenizer, SYSTEM_INSTRUCTION,
+            max_seq_length=args.max_seq_length,
+            shuffle_buffer=1,
+            num_epochs=1,
+        ) if os.path.exists(args.val_path) else None
+        if args.resume_from_checkpoint:
+            stream_state = load_stream_state(args.resume_from_checkpoint, rank)
+            if stream_state is not None:
+                train_ds.load_state_dict(stream_state)
+            else:
+                print(f"⚠️ No stream state for rank {rank} in {args.resume_from_checkpoint}, "
+                      "the stream restarts from the beginning (multi-node runs need a shared "
+                      "out_dir or --save_on_each_node)")
+
     # 4) Turn each row into chat messages; SFTTrainer masks loss to assistant
     def to_messages(ex):
         return [
@@ -124,10 +200,12 @@ if __name__ == "__main__":
     # General training arguments
     training_args = TrainingArguments(
         output_dir=args.out_dir,
-        per_device_train_batch_size=1,
-        gradient_accumulation_steps=8,
+        per_device_train_batch_size=args.per_device_train_batch_size,
+        gradient_accumulation_steps=args.gradient_accumulation_steps,
         learning_rate=2e-4,
         num_train_epochs=2,
+        max_steps=args.max_steps,
+        seed=args.seed,
         warmup_ratio=0.03,
         logging_steps=10,
         save_steps=500,
@@ -135,10 +213,20 @@ if __name__ == "__main__":
         # Markov do not support these
         bf16=False,  # Disabled for CPU/older GPU compatibility
         fp16=False,  # Also disable fp16 for CPU compatibility
-        gradient_checkpointing=True,
+        gradient_checkpointing=args.gradient_checkpointing,
         report_to=report_to,
         eval_strategy="steps" if val_ds else "no",
         eval_steps=500 if val_ds else None,
+        # the stream restores its own position from the checkpoint
+        ignore_data_skip=args.streaming,
+        dataloader_num_workers=0,
+        # frozen base weights are excluded from DDP above, buffers are not re-broadcast every
+        # forward, so gloo only ever moves the LoRA gradients
+        ddp_backend="gloo" if distributed and not torch.cuda.is_available() else None,
+        ddp_find_unused_parameters=False if distributed else None,
+        ddp_broadcast_buffers=False if distributed else None,
+        save_on_each_node=args.save_on_each_node,
+        gradient_checkpointing_kwargs={"use_reentrant": False} if distributed else None,
     )
 
     # SFT-specific configuration
@@ -147,18 +235,35 @@ if __name__ == "__main__":
     )
 
     # Train
-    trainer = SFTTrainer(
-        model=model,
-        train_dataset=train_ds,
-        args=training_args,
-        sft_config=sft_config,
-        formatting_func=to_messages,
-        max_seq_length=2048,
-    )
-    trainer.train()
+    if args.streaming:
+        # snapshot the stream once per optimizer step so checkpoints can resume it
+        blocks_per_step = training_args.per_device_train_batch_size * training_args.gradient_accumulation_steps
+        train_ds.snapshot_every = blocks_per_step
+        if args.gradient_checkpointing:
+            model.enable_input_require_grads()  # needed by gradient checkpointing with LoRA
+        # the stream shards itself per rank, StreamingTrainer feeds it without re-sharding
+        trainer = StreamingTrainer(
+            model=model,
+            train_dataset=train_ds,
+            eval_dataset=val_ds,
+            args=training_args,
+            callbacks=[StreamCheckpointCallback(train_ds, blocks_per_step)],
+        )
+    else:
+        trainer = SFTTrainer(
+            model=model,
+            train_dataset=train_ds,
+            args=training_args,
+            sft_config=sft_config,
+            formatting_func=to_messages,
+            max_seq_length=args.max_seq_length,
+        )
+    attach_telemetry(trainer, args.telemetry_dir, args.profile_start_step, args.profile_num_steps)
+    trainer.train(resume_from_checkpoint=args.resume_from_checkpoint)
 
-    # 7) Save tiny LoRA adapter + tokenizer
-    adapter_dir = Path(args.out_dir) / "adapter"
-    trainer.model.save_pretrained(adapter_dir.as_posix())
-    tokenizer.save_pretrained(adapter_dir.as_posix())
-    print(f"✅ Done. Adapter saved to: {adapter_dir}")
+    # 7) Save tiny LoRA adapter + tokenizer (once, weights are identical on every rank)
+    if trainer.is_world_process_zero():
+        adapter_dir = Path(args.out_dir) / "adapter"
+        trainer.model.save_pretrained(adapter_dir.as_posix())
+        tokenizer.save_pretrained(adapter_dir.as_posix())
+        print(f"✅ Done. Adapter saved to: {adapter_dir}")
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Data-Parallel Scaling Report
+Compares telemetry.json summaries of finetune runs launched with different worker counts
+"""
+
+import json
+import tyro
+
+from dataclasses import dataclass
+from typing import List
+from rich.console import Console
+from rich.table import Table
+
+
+@dataclass
+class Args:
+    """Data-parallel scaling report"""
+    runs: List[str]
+    """telemetry.json files (or telemetry dirs) of runs with different numbers of workers"""
+
+
+def load_summary(path: str) -> dict:
+    if not path.endswith(".json"):
+        path = f"{path.rstrip('/')}/telemetry.json"
+    with open(path, 'r', encoding='utf-8') as f:
+        summary = json.load(f)
+    summary["path"] = path
+    return summary
+
+
+def main():
+    args = tyro.cli(Args)
+    console = Console()
+
+    summaries = sorted((load_summary(p) for p in args.runs), key=lambda s: s.get("world_size", 1))
+    if not summaries:
+        console.print("[red]❌ No runs given[/red]")
+        return
+
+    # Efficiency of N workers = throughput(N) / (N / N_base * throughput(N_base))
+    base = summaries[0]
+    base_workers = base.get("world_size", 1)
+    base_tps = base.get("global_tokens_per_sec", base["tokens_per_sec"])
+
+    table = Table(title="Data-parallel scaling")
+    table.add_column("Workers", justify="right")
+    table.add_column("Tokens/sec", justify="right")
+    table.add_column("Samples/sec", justify="right")
+    table.add_column("Speedup", justify="right")
+    table.add_column("Efficiency", justify="right")
+    table.add_column("Peak RSS/worker (MB)", justify="right")
+
+    for s in summaries:
+        workers = s.get("world_size", 1)
+        tps = s.get("global_tokens_per_sec", s["tokens_per_sec"])
+        speedup = tps / base_tps if base_tps else 0.0
+        efficiency = speedup / (workers / base_workers)
+        table.add_row(
+            str(workers),
+            f"{tps:,.1f}",
+            f"{s.get('global_samples_per_sec', s['samples_per_sec']):,.3f}",
+            f"{speedup:.2f}x",
+            f"{efficiency:.0%}",
+            f"{s.get('max_worker_peak_rss_mb', s['peak_rss_mb']):,.1f}",
+        )
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import os
+import json
+import random
+
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import torch
+from torch.utils.data import DataLoader, IterableDataset
+from transformers import Trainer, TrainerCallback, default_data_collator
+
+
+IGNORE_INDEX = -100  # label value skipped by the loss
+
+
+def stream_state_file(rank: int = 0) -> str:
+    return f"stream_state_rank{rank}.json"
+
+
+def encode_example(tokenizer, ex: Dict, system_instruction: str) -> Tuple[List[int], int]:
+    """Tokenize one sample as a system/user/assistant chat, terminated by EOS.
+
+    Returns the token ids and the length of the system+user prompt, which is
+    excluded from the loss.
+    """
+    messages = [
+        {"role":"system",    "content": system_instruction},
+        {"role":"user",      "content": ex["input"]},
+        {"role":"assistant", "content": ex["output"]},
+    ]
+    if tokenizer.chat_template:
+        ids = list(tokenizer.apply_chat_template(messages, tokenize=True, return_dict=False))
+        prompt_len = len(tokenizer.apply_chat_template(
+            messages[:2], tokenize=True, add_generation_prompt=True, return_dict=False
+        ))
+    else:
+        # base models (e.g. mistral-7b) ship without a chat template
+        prompt = "\n\n".join(m["content"] for m in messages[:2]) + "\n\n"
+        ids = tokenizer(prompt, add_special_tokens=True)["input_ids"]
+        prompt_len = len(ids)
+        ids = ids + tokenizer(ex["output"], add_special_tokens=False)["input_ids"]
+    if tokenizer.eos_token_id is not None and (not ids or ids[-1] != tokenizer.eos_token_id):
+        ids = ids + [tokenizer.eos_token_id]
+    return ids, prompt_len
+
+
+class PackedJsonlStream(IterableDataset):
+    """
+    Stream a JSONL split from disk and pack it on the fly into max_seq_length blocks.
+
+    Only the assistant answer (and its EOS) is trained on, prompt tokens get
+    IGNORE_INDEX labels. `position_ids` restart at 0 for every packed sample; with
+    flash_attention_2 this keeps samples from attending to each other, with the default
+    attention implementations samples in a block do see the preceding ones, as with
+    TRL's `packing=True`.
+
+    The shuffle buffer holds byte offsets (not samples), so memory stays flat no
+    matter how large the file is. The stream loops over epochs by itself (or stops
+    after `num_epochs`) and snapshots its state every `snapshot_every` blocks so that
+    training can resume mid-epoch without replaying the data. Must be consumed with
+    dataloader_num_workers=0, as the snapshots live in the iterating process.
+
+    With `world_size` > 1 each rank keeps only every world_size-th sample of the
+    file, so data-parallel workers see disjoint shards. Feed it through
+    `stream_dataloader` (or `StreamingTrainer`) so it is not sharded a second time.
+    """
+
+    def __init__(self, path: str, tokenizer, system_instruction: str,
+                 max_seq_length: int = 2048, shuffle_buffer: int = 10000, seed: int = 3407,
+                 num_epochs: Optional[int] = None, snapshot_every: int = 1,
+                 rank: int = 0, world_size: int = 1):
+        self.path = path
+        self.tokenizer = tokenizer
+        self.system_instruction = system_instruction
+        self.max_seq_length = max_seq_length
+        self.shuffle_buffer = max(1, shuffle_buffer)
+        self.seed = seed
+        self.num_epochs = num_epochs
+        self.snapshot_every = max(1, snapshot_every)
+        self.rank = rank
+        self.world_size = world_size
+        self._resume_state = None
+        self._snapshots = deque(maxlen=64)
+
+    def _fresh_state(self) -> Dict:
+        return {"epoch": 0, "offset": 0, "line": 0, "buffer": [],
+                "carry": [], "carry_labels": [], "carry_positions": [], "blocks": 0,
+                "rng": random.Random(self.seed).getstate()}
+
+    def load_state_dict(self, state: Dict) -> None:
+        """Resume from a state produced by `snapshot_at` (e.g. stored in a checkpoint)"""
+        state = dict(state)
+        version, internal, gauss_next = state["rng"]
+        state["rng"] = (version, tuple(internal), gauss_next)
+        self._resume_state = state
+
+    def snapshot_at(self, blocks: int) -> Optional[Dict]:
+        """State of the stream right after `blocks` blocks were produced, if still retained"""
+        for snapshot in reversed(self._snapshots):
+            if snapshot["blocks"] == blocks:
+                return snapshot
+        return None
+
+    def _snapshot(self, state: Dict, rng: random.Random) -> None:
+        self._snapshots.append({
+            "epoch": state["epoch"],
+            "offset": state["offset"],
+            "line": state["line"],
+            "buffer": list(state["buffer"]),
+            "carry": list(state["carry"]),
+            "carry_labels": list(state["carry_labels"]),
+            "carry_positions": list(state["carry_positions"]),
+            "blocks": state["blocks"],
+            "rng": rng.getstate(),
+        })
+
+    def _block(self, ids: List[int], labels: List[int], positions: List[int]) -> Dict[str, torch.Tensor]:
+        input_ids = torch.tensor(ids, dtype=torch.long)
+        return {
+            "input_ids": input_ids,
+            "attention_mask": torch.ones_like(input_ids),
+            "position_ids": torch.tensor(positions, dtype=torch.long),
+            "labels": torch.tensor(labels, dtype=torch.long),
+        }
+
+    def __iter__(self) -> Iterator[Dict[str, torch.Tensor]]:
+        state = self._resume_state or self._fresh_state()
+        self._resume_state = None
+        rng = random.Random()
+        rng.setstate(state["rng"])
+        buffer = state["buffer"]
+        carry, carry_labels, carry_positions = state["carry"], state["carry_labels"], state["carry_positions"]
+        L = self.max_seq_length
+
+        with open(self.path, 'rb') as reader, open(self.path, 'rb') as data:
+            reader.seek(state["offset"])
+            while True:
+                # Emit every full block we already have
+                while len(carry) >= L:
+                    block = self._block(carry[:L], carry_labels[:L], carry_positions[:L])
+                    carry, carry_labels, carry_positions = carry[L:], carry_labels[L:], carry_positions[L:]
+                    state["carry"] = carry
+                    state["carry_labels"] = carry_labels
+                    state["carry_positions"] = carry_positions
+                    state["blocks"] += 1
+                    if state["blocks"] % self.snapshot_every == 0:
+                        self._snapshot(state, rng)
+                    yield block
+
+                # Top up the shuffle buffer with offsets of unread lines
+                while len(buffer) < self.shuffle_buffer:
+                    line = reader.readline()
+                    if not line:
+                        break
+                    if line.strip():
+                        if state["line"] % self.world_size == self.rank:
+                            buffer.append(state["offset"])
+                        state["line"] += 1
+                    state["offset"] += len(line)
+
+                if not buffer:
+                    if state["line"] <= self.rank:
+                        raise ValueError(f"No samples found in {self.path} for rank {self.rank}")
+                    # End of epoch: the partial carry is kept and continues into the next one
+                    state["epoch"] += 1
+                    if self.num_epochs is not None and state["epoch"] >= self.num_epochs:
+                        return
+                    state["offset"] = 0
+                    state["line"] = 0
+                    reader.seek(0)
+                    rng.seed(self.seed + state["epoch"])
+                    continue
+
+                # Draw a random buffered sample
+                i = rng.randrange(len(buffer))
+                buffer[i], buffer[-1] = buffer[-1], buffer[i]
+                data.seek(buffer.pop())
+                try:
+                    ex = json.loads(data.readline())
+                except json.JSONDecodeError:
+                    continue
+                ids, prompt_len = encode_example(self.tokenizer, ex, self.system_instruction)
+                carry.extend(ids)
+                carry_labels.extend([IGNORE_INDEX] * prompt_len + ids[prompt_len:])
+                carry_positions.extend(range(len(ids)))
+
+
+def stream_dataloader(stream: PackedJsonlStream, batch_size: int) -> DataLoader:
+    """Plain in-process DataLoader: the stream is already sharded per rank and its
+    snapshots must match the blocks actually trained on"""
+    return DataLoader(stream, batch_size=batch_size, collate_fn=default_data_collator, num_workers=0)
+
+
+class StreamingTrainer(Trainer):
+    """
+    Trainer for PackedJsonlStream datasets. It bypasses accelerate's dataloader
+    preparation, which would wrap the iterable in IterableDatasetShard and keep only
+    every world_size-th batch of the already sharded stream.
+    """
+
+    def get_train_dataloader(self) -> DataLoader:
+        return stream_dataloader(self.train_dataset, self._train_batch_size)
+
+    def get_eval_dataloader(self, eval_dataset=None) -> DataLoader:
+        if isinstance(eval_dataset, str):
+            eval_dataset = self.eval_dataset[eval_dataset]
+        return stream_dataloader(eval_dataset or self.eval_dataset, self.args.per_device_eval_batch_size)
+
+
+class StreamCheckpointCallback(TrainerCallback):
+    """Store the training stream position next to every checkpoint"""
+
+    def __init__(self, stream: PackedJsonlStream, blocks_per_step: int):
+        self.stream = stream
+        self.blocks_per_step = blocks_per_step
+
+    def on_save(self, args, state, control, **kwargs):
+        consumed = state.global_step * self.blocks_per_step
+        snapshot = self.stream.snapshot_at(consumed)
+        if snapshot is None:
+            print(f"⚠️ No stream snapshot for step {state.global_step}, resume will restart the stream")
+            return
+        checkpoint_dir = os.path.join(args.output_dir, f"checkpoint-{state.global_step}")
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        path = os.path.join(checkpoint_dir, stream_state_file(self.stream.rank))
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+
+
+def load_stream_state(checkpoint_dir: str, rank: int = 0) -> Optional[Dict]:
+    """Read the stream position saved by StreamCheckpointCallback for this rank, if any"""
+    path = os.path.join(checkpoint_dir, stream_state_file(rank))
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,250 @@
+import os
+import csv
+import json
+import time
+import resource
+
+from typing import Dict
+
+import torch
+from transformers import TrainerCallback
+
+
+CSV_FIELDS = [
+    "step", "step_time", "data_time", "forward_time", "backward_time", "optimizer_time", "other_time",
+    "samples", "tokens", "real_tokens", "padding_ratio",
+    "samples_per_sec", "tokens_per_sec", "peak_rss_mb",
+]
+
+
+def _sync() -> None:
+    # CUDA kernels are async, without a sync timings would only measure the launch
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (ru_maxrss is KB on Linux, bytes on macOS)"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if os.uname().sysname == "Darwin" else rss / 1024
+
+
+class TelemetryCallback(TrainerCallback):
+    """
+    Per optimizer step throughput and timing telemetry, written to
+    `<out_dir>/telemetry.csv` (one row per step) and `<out_dir>/telemetry.json` (summary).
+
+    Data time comes from wrapping `Trainer.get_batch_samples` (batch fetch and
+    collation), forward time from hooks on the model, backward time from wrapping
+    `accelerator.backward`, optimizer time from the pre/post optimizer step events.
+    Other time is the rest of the step (grad clipping, zero_grad, LR scheduler,
+    DDP bookkeeping, logging callbacks).
+    Evaluation and checkpoint saving are excluded from step times.
+    Use `attach_telemetry` to install it on a trainer.
+    """
+
+    def __init__(self, out_dir: str, profile_start_step: int = -1, profile_num_steps: int = 3):
+        self.out_dir = out_dir
+        self.profile_start_step = profile_start_step
+        self.profile_num_steps = profile_num_steps
+        self._profiler = None
+        self._csv = None
+        self._writer = None
+        self._reset()
+        self._totals = {"steps": 0, "time": 0.0, "samples": 0, "tokens": 0, "real_tokens": 0}
+        self._global = None
+
+    def _reset(self) -> None:
+        self._step = {"data": 0.0, "forward": 0.0, "backward": 0.0, "optimizer": 0.0,
+                      "samples": 0, "tokens": 0, "real_tokens": 0}
+        self._step_start = time.perf_counter()
+
+    # -- instrumentation hooks -------------------------------------------------
+
+    def forward_pre_hook(self, module, args, kwargs):
+        if not module.training:
+            return
+        input_ids = kwargs.get("input_ids", args[0] if args else None)
+        if input_ids is not None:
+            attention_mask = kwargs.get("attention_mask")
+            self._step["samples"] += input_ids.shape[0]
+            self._step["tokens"] += input_ids.numel()
+            self._step["real_tokens"] += (
+                int(attention_mask.sum()) if attention_mask is not None else input_ids.numel()
+            )
+        _sync()
+        self._forward_start = time.perf_counter()
+
+    def forward_hook(self, module, args, kwargs, output):
+        if not module.training:
+            return
+        _sync()
+        self._step["forward"] += time.perf_counter() - self._forward_start
+
+    def wrap_fetch(self, get_batch_samples):
+        def timed_get_batch_samples(*args, **kwargs):
+            start = time.perf_counter()
+            result = get_batch_samples(*args, **kwargs)
+            self._step["data"] += time.perf_counter() - start
+            return result
+        return timed_get_batch_samples
+
+    def wrap_backward(self, backward):
+        def timed_backward(loss, **kwargs):
+            start = time.perf_counter()
+            result = backward(loss, **kwargs)
+            _sync()
+            self._step["backward"] += time.perf_counter() - start
+            return result
+        return timed_backward
+
+    # -- trainer events --------------------------------------------------------
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        if not state.is_world_process_zero:
+            return
+        os.makedirs(self.out_dir, exist_ok=True)
+        self._csv = open(os.path.join(self.out_dir, "telemetry.csv"), 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._csv, fieldnames=CSV_FIELDS)
+        self._writer.writeheader()
+        if self.profile_start_step == state.global_step:
+            self._start_profiler()
+        self._reset()
+
+    def on_pre_optimizer_step(self, args, state, control, **kwargs):
+        _sync()
+        self._optimizer_start = time.perf_counter()
+
+    def on_optimizer_step(self, args, state, control, **kwargs):
+        _sync()
+        self._step["optimizer"] += time.perf_counter() - self._optimizer_start
+
+    def on_step_end(self, args, state, control, **kwargs):
+        step_time = time.perf_counter() - self._step_start
+        s = self._step
+        tokens = s["tokens"]
+        row = {
+            "step": state.global_step,
+            "step_time": round(step_time, 4),
+            "data_time": round(s["data"], 4),
+            "forward_time": round(s["forward"], 4),
+            "backward_time": round(s["backward"], 4),
+            "optimizer_time": round(s["optimizer"], 4),
+            "other_time": round(max(0.0, step_time - s["data"] - s["forward"] - s["backward"] - s["optimizer"]), 4),
+            "samples": s["samples"],
+            "tokens": tokens,
+            "real_tokens": s["real_tokens"],
+            "padding_ratio": round(1 - s["real_tokens"] / tokens, 4) if tokens else 0.0,
+            "samples_per_sec": round(s["samples"] / step_time, 3),
+            "tokens_per_sec": round(tokens / step_time, 1),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        }
+
+        self._totals["steps"] += 1
+        self._totals["time"] += step_time
+        for key in ("samples", "tokens", "real_tokens"):
+            self._totals[key] += s[key]
+
+        if self._writer is not None:
+            self._writer.writerow(row)
+            self._csv.flush()
+
+        if self._profiler is not None:
+            self._profiler.step()
+            if state.global_step >= self.profile_start_step + self.profile_num_steps:
+                self._stop_profiler()
+        elif state.global_step == self.profile_start_step:
+            self._start_profiler()
+
+        # start the next step's clock, on_evaluate/on_save restart it after eval and checkpointing
+        self._reset()
+
+    def on_evaluate(self, args, state, control, **kwargs):
+        # Trainer evaluates after on_step_end, keep eval time out of the next step
+        self._step_start = time.perf_counter()
+
+    def on_save(self, args, state, control, **kwargs):
+        # same for checkpoint saving
+        self._step_start = time.perf_counter()
+
+    def on_train_end(self, args, state, control, **kwargs):
+        if self._profiler is not None:
+            self._stop_profiler()
+        # collective: every rank must take part before non-main ranks return
+        self._global = self._reduce_totals()
+        if self._csv is None:
+            return
+        self._csv.close()
+        self._csv = None
+        with open(os.path.join(self.out_dir, "telemetry.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2)
+        print(f"📈 Telemetry saved to: {self.out_dir}")
+
+    def _reduce_totals(self) -> Dict:
+        """Sum throughput over data-parallel ranks, the slowest rank sets the wall time"""
+        t = self._totals
+        if not (torch.distributed.is_available() and torch.distributed.is_initialized()):
+            return {"world_size": 1, "time": t["time"], "samples": t["samples"],
+                    "tokens": t["tokens"], "peak_rss_mb": peak_rss_mb()}
+        device = "cuda" if torch.distributed.get_backend() == "nccl" else "cpu"
+        counts = torch.tensor([t["samples"], t["tokens"]], dtype=torch.float64, device=device)
+        maxes = torch.tensor([t["time"], peak_rss_mb()], dtype=torch.float64, device=device)
+        torch.distributed.all_reduce(counts, op=torch.distributed.ReduceOp.SUM)
+        torch.distributed.all_reduce(maxes, op=torch.distributed.ReduceOp.MAX)
+        return {"world_size": torch.distributed.get_world_size(), "time": maxes[0].item(),
+                "samples": int(counts[0].item()), "tokens": int(counts[1].item()),
+                "peak_rss_mb": maxes[1].item()}
+
+    def summary(self) -> Dict:
+        t = self._totals
+        g = self._global or self._reduce_totals()
+        return {
+            "steps": t["steps"],
+            "train_time": round(t["time"], 2),
+            "samples_per_sec": round(t["samples"] / t["time"], 3) if t["time"] else 0.0,
+            "tokens_per_sec": round(t["tokens"] / t["time"], 1) if t["time"] else 0.0,
+            "real_token_ratio": round(t["real_tokens"] / t["tokens"], 4) if t["tokens"] else 0.0,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            # aggregated over all data-parallel workers, used by scaling_report.py
+            "world_size": g["world_size"],
+            "global_samples_per_sec": round(g["samples"] / g["time"], 3) if g["time"] else 0.0,
+            "global_tokens_per_sec": round(g["tokens"] / g["time"], 1) if g["time"] else 0.0,
+            "max_worker_peak_rss_mb": round(g["peak_rss_mb"], 1),
+        }
+
+    # -- profiler --------------------------------------------------------------
+
+    def _start_profiler(self) -> None:
+        if self._csv is None:
+            return  # only profile on the main process
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        self._profiler = torch.profiler.profile(
+            activities=activities, record_shapes=True, profile_memory=True, with_stack=False
+        )
+        self._profiler.__enter__()
+
+    def _stop_profiler(self) -> None:
+        self._profiler.__exit__(None, None, None)
+        start, end = self.profile_start_step, self.profile_start_step + self.profile_num_steps
+        trace_path = os.path.join(self.out_dir, f"profile_steps_{start}-{end}.json")
+        self._profiler.export_chrome_trace(trace_path)
+        print(self._profiler.key_averages().table(sort_by="self_cpu_time_total", row_limit=20))
+        print(f"🔬 Profiler trace saved to: {trace_path}")
+        self._profiler = None
+
+
+def attach_telemetry(trainer, out_dir: str, profile_start_step: int = -1,
+                     profile_num_steps: int = 3) -> TelemetryCallback:
+    """Install a TelemetryCallback and its timing hooks on a (SFT)Trainer"""
+    callback = TelemetryCallback(out_dir, profile_start_step, profile_num_steps)
+    trainer.model.register_forward_pre_hook(callback.forward_pre_hook, with_kwargs=True)
+    trainer.model.register_forward_hook(callback.forward_hook, with_kwargs=True)
+    trainer.accelerator.backward = callback.wrap_backward(trainer.accelerator.backward)
+    if hasattr(trainer, "get_batch_samples"):
+        trainer.get_batch_samples = callback.wrap_fetch(trainer.get_batch_samples)
+    else:
+        print("⚠️ Trainer.get_batch_samples not available (transformers < 4.46), data_time will read 0")
+    trainer.add_callback(callback)
+    return callback
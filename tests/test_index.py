@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "dataset"))
+
+from index import JsonlIndex  # noqa: E402
+
+
+def make_sample(i):
+    action = "use Tackle" if i % 2 else "switch to Mew"
+    return {
+        "input": f"Pokemon Battle Turn {i % 5}\n\nYour active: Pikachu{i % 3}\n\nWhat is the best action to take?",
+        "output": action,
+    }
+
+
+def write_split(path, samples, junk=False):
+    with open(path, 'w', encoding='utf-8') as f:
+        for i, sample in enumerate(samples):
+            if junk and i == 3:
+                f.write("\n")
+                f.write("{not json\n")
+            f.write(json.dumps(sample) + "\n")
+
+
+@pytest.fixture
+def split_file(tmp_path):
+    path = str(tmp_path / "train.jsonl")
+    write_split(path, [make_sample(i) for i in range(20)], junk=True)
+    return path
+
+
+def test_getitem_skips_blank_and_malformed_lines(split_file):
+    with JsonlIndex(split_file) as index:
+        assert len(index) == 20
+        assert index[0] == make_sample(0)
+        assert index[3] == make_sample(3)
+        assert index[19] == make_sample(19)
+        assert index[-1] == make_sample(19)
+        assert index[-20] == make_sample(0)
+        with pytest.raises(IndexError):
+            index[20]
+        with pytest.raises(IndexError):
+            index[-21]
+
+
+def test_filter_intersects_fields(split_file):
+    expected = [i for i in range(20) if i % 2 == 0 and i % 5 == 2 and i % 3 == 1]
+    with JsonlIndex(split_file) as index:
+        assert index.filter(type="switch", turn=2, pokemon="pikachu1") == expected
+        assert index.filter(type="move") == [i for i in range(20) if i % 2]
+        assert index.filter(turn=9) == []
+        assert index.filter() == list(range(20))
+        with pytest.raises(KeyError):
+            index.filter(rating="1500")
+
+
+def test_filter_pokemon_is_case_insensitive(split_file):
+    with JsonlIndex(split_file) as index:
+        assert index.filter(pokemon="PIKACHU2") == index.filter(pokemon="pikachu2")
+        assert index.filter(pokemon="Pikachu2") == [i for i in range(20) if i % 3 == 2]
+
+
+def test_rebuilds_after_source_changes(split_file):
+    with JsonlIndex(split_file) as index:
+        assert len(index) == 20
+        assert index.filter(turn=0) == [0, 5, 10, 15]
+
+    with open(split_file, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(make_sample(20)) + "\n")
+
+    with JsonlIndex(split_file) as index:
+        assert len(index) == 21
+        assert index[-1] == make_sample(20)
+        assert index.filter(turn=0) == [0, 5, 10, 15, 20]
+
+
+def test_select(split_file):
+    with JsonlIndex(split_file) as index:
+        assert [k for k, _ in index.select(3, start=5)] == [5, 6, 7]
+        assert [k for k, _ in index.select(3, start=18)] == [18, 19]
+        assert [k for k, _ in index.select(2, start=1, turn=4)] == [9, 14]
+
+        picked = [k for k, _ in index.select(5, shuffle=True, seed=0)]
+        assert picked == [k for k, _ in index.select(5, shuffle=True, seed=0)]
+        assert len(set(picked)) == 5
+
+        switches = [k for k, sample in index.select(50, shuffle=True, seed=1, type="switch")]
+        assert sorted(switches) == list(range(0, 20, 2))
+
+        assert list(index.select(3, turn=9)) == []
+        assert list(index.select(3, shuffle=True, pokemon="mew")) == []
@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+from streaming import (  # noqa: E402
+    IGNORE_INDEX,
+    PackedJsonlStream,
+    StreamCheckpointCallback,
+    load_stream_state,
+    stream_dataloader,
+)
+
+
+WORLD_SIZE = 2
+BATCH_SIZE = 1
+GRAD_ACCUM = 2
+BLOCKS_PER_STEP = BATCH_SIZE * GRAD_ACCUM
+
+
+class DigitTokenizer:
+    """Tokenizer stand-in: every integer in the text becomes one token id"""
+    chat_template = None
+    eos_token_id = 0
+
+    def __call__(self, text, add_special_tokens=True):
+        return {"input_ids": [int(tok) for tok in text.split() if tok.isdigit()]}
+
+
+@pytest.fixture
+def split_file(tmp_path):
+    path = tmp_path / "train.jsonl"
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(1, 41):
+            f.write(json.dumps({"input": f"{i}", "output": f"{i}"}) + "\n")
+    return str(path)
+
+
+def make_stream(path, rank):
+    return PackedJsonlStream(path, DigitTokenizer(), "system", max_seq_length=5,
+                             shuffle_buffer=4, seed=7, snapshot_every=BLOCKS_PER_STEP,
+                             rank=rank, world_size=WORLD_SIZE)
+
+
+def take(iterator, n):
+    return [next(iterator)["input_ids"].tolist() for _ in range(n)]
+
+
+def test_two_ranks_shard_and_resume(split_file, tmp_path):
+    steps, more = 5, 6
+    first_epoch_tokens = []
+
+    for rank in range(WORLD_SIZE):
+        stream = make_stream(split_file, rank)
+        batches = iter(stream_dataloader(stream, BATCH_SIZE))
+        seen = take(batches, steps * BLOCKS_PER_STEP)
+
+        # the snapshot for the checkpointed step is still available and gets written
+        callback = StreamCheckpointCallback(stream, BLOCKS_PER_STEP)
+        callback.on_save(SimpleNamespace(output_dir=str(tmp_path)),
+                         SimpleNamespace(global_step=steps), None)
+        checkpoint_dir = os.path.join(str(tmp_path), f"checkpoint-{steps}")
+        state = load_stream_state(checkpoint_dir, rank)
+        assert state is not None
+        assert state["blocks"] == steps * BLOCKS_PER_STEP
+
+        expected = take(batches, more)
+
+        resumed = make_stream(split_file, rank)
+        resumed.load_state_dict(state)
+        assert take(iter(stream_dataloader(resumed, BATCH_SIZE)), more) == expected
+
+        first_epoch_tokens.append({tok for batch in seen for tok in batch[0] if tok != 0})
+
+    # each rank sees its own, disjoint shard of the samples
+    assert first_epoch_tokens[0].isdisjoint(first_epoch_tokens[1])
+    assert all(tok % WORLD_SIZE == 1 for tok in first_epoch_tokens[0])
+    assert all(tok % WORLD_SIZE == 0 for tok in first_epoch_tokens[1])
+
+
+def test_loss_only_on_assistant_tokens(split_file):
+    stream = make_stream(split_file, rank=0)
+    blocks = iter(stream)
+    masked = 0
+    for _ in range(8):
+        block = next(blocks)
+        for token, label, position in zip(block["input_ids"].tolist(), block["labels"].tolist(),
+                                          block["position_ids"].tolist()):
+            # each sample packs as [prompt, answer, eos] at positions [0, 1, 2]
+            assert position in (0, 1, 2)
+            if position == 0:
+                assert label == IGNORE_INDEX
+                masked += 1
+            else:
+                assert label == token
+    assert masked > 0